@@ -61,7 +61,9 @@ class AILSimplifier(Analysis):
 
         # propagator
         propagator = self.project.analyses.Propagator(func=self.func, func_graph=self.func_graph)
-        replacements = list(propagator._states.values())[0]._replacements
+        replacements = propagator.replacements
+        if not replacements:
+            return False
 
         # take replacements and rebuild the corresponding blocks
         replacements_by_block_addrs_and_idx = defaultdict(dict)
@@ -1,26 +1,138 @@
 # pylint:disable=arguments-differ
-from typing import Optional, TYPE_CHECKING
+from typing import TYPE_CHECKING
+import operator
 import logging
 
-from ailment import Block, Stmt, Expr
+from ailment import Stmt, Expr
 
-from ...utils.constants import is_alignment_mask
+from ...utils.constants import ALIGNMENT_MASKS
 from ...engines.light import SimEngineLightAILMixin
 from ...sim_variable import SimStackVariable
 from .engine_base import SimEnginePropagatorBase
-from .values import Top
+from .values import Top, get_top
 
 if TYPE_CHECKING:
     from .propagator import PropagatorAILState
 
 l = logging.getLogger(name=__name__)
 
+# StackBaseOffset is a subclass of BasePointerOffset
+_BASE_POINTER_OFFSET_TYPES = (Expr.BasePointerOffset, Expr.StackBaseOffset)
+
+# binary operations that are folded right away when both operands are constants
+_CONST_FOLDERS = {
+    'And': operator.and_,
+    'Xor': operator.xor,
+    'Shl': operator.lshift,
+    'Sal': operator.lshift,
+    'Shr': operator.rshift,
+}
+
+# masks for commonly used bit widths
+_MASKS = {bits: (1 << bits) - 1 for bits in (1, 8, 16, 32, 64, 128, 256)}
+
 
 class SimEnginePropagatorAIL(
     SimEngineLightAILMixin,
     SimEnginePropagatorBase,
 ):
 
+    __slots__ = ('_sp_offset', '_bp_offset', '_bits', '_expr_handlers', '_op_handlers',
+                 '_pending_replacements', '_pending_equivalences', '_stmt_codeloc', )
+
+    state: 'PropagatorAILState'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        # architecture-specific constants, cached when the engine sees a new architecture
+        self._sp_offset = None
+        self._bp_offset = None
+        self._bits = None
+
+        # expression type -> handler function
+        self._expr_handlers = { }
+        # UnaryOp/BinaryOp operation name -> handler function
+        self._op_handlers = { }
+        # replacements and equivalences found in the current block, added to the state when the block is done
+        self._pending_replacements = [ ]
+        self._pending_equivalences = [ ]
+        # code location of the statement that is being processed, created on first use
+        self._stmt_codeloc = None
+
+    def _process(self, state, successors, *args, block=None, whitelist=None, **kwargs):
+        arch = state.arch
+        if arch is not self.arch:
+            # the engine is reused for all blocks of an analysis. only refresh the constants when the architecture
+            # changes
+            self._sp_offset = arch.sp_offset
+            self._bp_offset = arch.bp_offset
+            self._bits = arch.bits
+        self._pending_replacements = [ ]
+        self._pending_equivalences = [ ]
+
+        try:
+            super()._process(state, successors, *args, block=block, whitelist=whitelist, **kwargs)
+        finally:
+            state.flush_pending_stores()
+            state.add_replacements(self._pending_replacements)
+            state.add_equivalences(self._pending_equivalences)
+            self._pending_replacements = [ ]
+            self._pending_equivalences = [ ]
+
+    def _handle_Stmt(self, stmt):
+        self._stmt_codeloc = None
+        super()._handle_Stmt(stmt)
+
+    def _codeloc(self):
+        if self._stmt_codeloc is None:
+            self._stmt_codeloc = super()._codeloc()
+        return self._stmt_codeloc
+
+    def _expr(self, expr):
+        handler = self._expr_handlers.get(type(expr), None)
+        if handler is None:
+            handler = self._find_expr_handler(type(expr))
+            if handler is None:
+                return super()._expr(expr)
+            self._expr_handlers[type(expr)] = handler
+        return handler(self, expr)
+
+    def _find_expr_handler(self, expr_type):
+        """
+        Look up the expression handler in the same order as SimEngineLightAILMixin._expr().
+        """
+
+        expr_type_name = expr_type.__name__
+        if expr_type is Stmt.Call:
+            expr_type_name += "Expr"
+
+        cls = type(self)
+        handler = getattr(cls, "_handle_%s" % expr_type_name, None)
+        if handler is None:
+            handler = getattr(cls, "_ail_handle_%s" % expr_type_name, None)
+        return handler
+
+    def _find_op_handler(self, op: str):
+        handler = self._op_handlers.get(op, None)
+        if handler is None:
+            handler = getattr(type(self), "_ail_handle_%s" % op, None)
+            if handler is not None:
+                self._op_handlers[op] = handler
+        return handler
+
+    def _ail_handle_UnaryOp(self, expr):
+        handler = self._find_op_handler(expr.op)
+        if handler is None:
+            return super()._ail_handle_UnaryOp(expr)
+        return handler(self, expr)
+
+    def _ail_handle_BinaryOp(self, expr):
+        handler = self._find_op_handler(expr.op)
+        if handler is None:
+            return super()._ail_handle_BinaryOp(expr)
+        return handler(self, expr)
+
     #
     # AIL statement handlers
     #
@@ -32,8 +144,6 @@ class SimEnginePropagatorAIL(
         :return:
         """
 
-        self.state: 'PropagatorAILState'
-
         src = self._expr(stmt.src)
         dst = stmt.dst
 
@@ -49,9 +159,10 @@ class SimEnginePropagatorAIL(
 
         elif type(dst) is Expr.Register:
             self.state.store_variable(dst, src, self._codeloc())
-            if isinstance(stmt.src, (Expr.Register, Stmt.Call)):
+            src_type = type(stmt.src)
+            if src_type is Expr.Register or src_type is Stmt.Call:
                 # set equivalence
-                self.state.add_equivalence(self._codeloc(), dst, stmt.src)
+                self._pending_equivalences.append((self._codeloc(), dst, stmt.src))
         else:
             l.warning('Unsupported type of Assignment dst %s.', type(dst).__name__)
 
@@ -59,13 +170,13 @@ class SimEnginePropagatorAIL(
         addr = self._expr(stmt.addr)
         data = self._expr(stmt.data)
 
-        if isinstance(addr, Expr.StackBaseOffset):
+        if type(addr) is Expr.StackBaseOffset:
             if data is not None:
                 # Storing data to a stack variable
                 self.state.store_stack_variable(addr, data.bits // 8, data, endness=stmt.endness)
                 # set equivalence
                 var = SimStackVariable(addr.offset, data.bits // 8)
-                self.state.add_equivalence(self._codeloc(), var, stmt.data)
+                self._pending_equivalences.append((self._codeloc(), var, stmt.data))
 
     def _ail_handle_Jump(self, stmt):
         target = self._expr(stmt.target)
@@ -73,33 +184,30 @@ class SimEnginePropagatorAIL(
             return
 
         new_jump_stmt = Stmt.Jump(stmt.idx, target, **stmt.tags)
-        self.state.add_replacement(self._codeloc(),
-                                   stmt,
-                                   new_jump_stmt,
-                                   )
+        self._pending_replacements.append((self._codeloc(), stmt, new_jump_stmt))
 
     def _ail_handle_Call(self, expr_stmt: Stmt.Call):
-        _ = self._expr(expr_stmt.target)
+        self._visit_expr(expr_stmt.target)
 
         if expr_stmt.args:
             for arg in expr_stmt.args:
-                _ = self._expr(arg)
+                self._visit_expr(arg)
 
         if expr_stmt.ret_expr:
             # it has a return expression. awesome - treat it as an assignment
-            self.state.store_variable(expr_stmt.ret_expr, Top(expr_stmt.ret_expr.size), self._codeloc())
+            self.state.store_variable(expr_stmt.ret_expr, get_top(expr_stmt.ret_expr.size), self._codeloc())
             # set equivalence
-            self.state.add_equivalence(self._codeloc(), expr_stmt.ret_expr, expr_stmt)
+            self._pending_equivalences.append((self._codeloc(), expr_stmt.ret_expr, expr_stmt))
 
     def _ail_handle_ConditionalJump(self, stmt):
-        _ = self._expr(stmt.condition)
-        _ = self._expr(stmt.true_target)
-        _ = self._expr(stmt.false_target)
+        self._visit_expr(stmt.condition)
+        self._visit_expr(stmt.true_target)
+        self._visit_expr(stmt.false_target)
 
     def _ail_handle_Return(self, stmt: Stmt.Return):
         if stmt.ret_exprs:
             for ret_expr in stmt.ret_exprs:
-                self._expr(ret_expr)
+                self._visit_expr(ret_expr)
 
     #
     # AIL expression handlers
@@ -114,30 +222,30 @@ class SimEnginePropagatorAIL(
                 return expr
 
             l.debug("Add a replacement: %s with %s", expr, new_expr)
-            self.state.add_replacement(self._codeloc(), expr, new_expr)
+            self._pending_replacements.append((self._codeloc(), expr, new_expr))
             if type(new_expr) in [Expr.Register, Expr.Const, Expr.Convert, Expr.StackBaseOffset, Expr.BasePointerOffset]:
                 expr = new_expr
 
         if not self._propagate_tmps:
             # we should not propagate any tmps. as a result, we return None for reading attempts to a tmp.
-            return Top(expr.size)
+            return get_top(expr.size)
 
         return expr
 
     def _ail_handle_Register(self, expr):
         # Special handling for SP and BP
         if self._stack_pointer_tracker is not None:
-            if expr.reg_offset == self.arch.sp_offset:
-                sb_offset = self._stack_pointer_tracker.offset_before(self.ins_addr, self.arch.sp_offset)
+            if expr.reg_offset == self._sp_offset:
+                sb_offset = self._stack_pointer_tracker.offset_before(self.ins_addr, self._sp_offset)
                 if sb_offset is not None:
-                    new_expr = Expr.StackBaseOffset(None, self.arch.bits, sb_offset)
-                    self.state.add_replacement(self._codeloc(), expr, new_expr)
+                    new_expr = Expr.StackBaseOffset(None, self._bits, sb_offset)
+                    self._pending_replacements.append((self._codeloc(), expr, new_expr))
                     return new_expr
-            elif expr.reg_offset == self.arch.bp_offset:
-                sb_offset = self._stack_pointer_tracker.offset_before(self.ins_addr, self.arch.bp_offset)
+            elif expr.reg_offset == self._bp_offset:
+                sb_offset = self._stack_pointer_tracker.offset_before(self.ins_addr, self._bp_offset)
                 if sb_offset is not None:
-                    new_expr = Expr.StackBaseOffset(None, self.arch.bits, sb_offset)
-                    self.state.add_replacement(self._codeloc(), expr, new_expr)
+                    new_expr = Expr.StackBaseOffset(None, self._bits, sb_offset)
+                    self._pending_replacements.append((self._codeloc(), expr, new_expr))
                     return new_expr
 
         new_expr = self.state.get_variable(expr)
@@ -145,7 +253,7 @@ class SimEnginePropagatorAIL(
             # check if this new_expr uses any expression that has been overwritten
             if not self.is_using_outdated_def(new_expr):
                 l.debug("Add a replacement: %s with %s", expr, new_expr)
-                self.state.add_replacement(self._codeloc(), expr, new_expr)
+                self._pending_replacements.append((self._codeloc(), expr, new_expr))
                 expr = new_expr
         return expr
 
@@ -153,22 +261,22 @@ class SimEnginePropagatorAIL(
         addr = self._expr(expr.addr)
 
         if type(addr) is Top:
-            return Top(expr.size)
+            return get_top(expr.size)
 
-        if isinstance(addr, Expr.StackBaseOffset):
+        if type(addr) is Expr.StackBaseOffset:
             var = self.state.get_stack_variable(addr, expr.size, endness=expr.endness)
             if var is not None:
                 return var
 
-        if addr != expr.addr:
-            return Expr.Load(expr.idx, addr, expr.size, expr.endness, **expr.tags)
-        return expr
+        if addr is expr.addr or addr == expr.addr:
+            return expr
+        return Expr.Load(expr.idx, addr, expr.size, expr.endness, **expr.tags)
 
     def _ail_handle_Convert(self, expr):
         operand_expr = self._expr(expr.operand)
 
         if type(operand_expr) is Top:
-            return Top(expr.to_bits // 8)
+            return get_top(expr.to_bits // 8)
 
         if type(operand_expr) is Expr.Convert:
             if expr.from_bits == operand_expr.to_bits and expr.to_bits == operand_expr.from_bits:
@@ -179,10 +287,16 @@ class SimEnginePropagatorAIL(
         elif type(operand_expr) is Expr.Const:
             # do the conversion right away
             value = operand_expr.value
-            mask = (2 ** expr.to_bits) - 1
+            mask = _MASKS.get(expr.to_bits, None)
+            if mask is None:
+                mask = (1 << expr.to_bits) - 1
             value &= mask
             return Expr.Const(expr.idx, operand_expr.variable, value, expr.to_bits)
 
+        if operand_expr is expr.operand:
+            # nothing has changed
+            return expr
+
         converted = Expr.Convert(expr.idx, expr.from_bits, expr.to_bits, expr.is_signed, operand_expr, **expr.tags)
         return converted
 
@@ -193,150 +307,91 @@ class SimEnginePropagatorAIL(
         return expr
 
     def _ail_handle_ITE(self, expr: Expr.ITE):
-        cond = self._expr(expr.cond)  # pylint:disable=unused-variable
-        iftrue = self._expr(expr.iftrue)  # pylint:disable=unused-variable
-        iffalse = self._expr(expr.iffalse)  # pylint:disable=unused-variable
+        self._visit_expr(expr.cond)
+        self._visit_expr(expr.iftrue)
+        self._visit_expr(expr.iffalse)
 
         return expr
 
     def _ail_handle_CallExpr(self, expr_stmt: Stmt.Call):  # pylint:disable=useless-return
-        _ = self._expr(expr_stmt.target)
+        self._visit_expr(expr_stmt.target)
 
         if expr_stmt.args:
             for arg in expr_stmt.args:
-                _ = self._expr(arg)
+                self._visit_expr(arg)
 
         # ignore ret_expr
         return expr_stmt
 
-    def _ail_handle_CmpLE(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpLE', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpLEs(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpLEs', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpLT(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpLT', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpLTs(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpLTs', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpGE(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpGE', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpGEs(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpGEs', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpGT(self, expr):
+    def _ail_handle_Cmp(self, expr):
         operand_0 = self._expr(expr.operands[0])
         operand_1 = self._expr(expr.operands[1])
 
         if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
+            return get_top(1)
 
-        return Expr.BinaryOp(expr.idx, 'CmpGT', [ operand_0, operand_1 ], expr.signed, **expr.tags)
+        if operand_0 is expr.operands[0] and operand_1 is expr.operands[1]:
+            # nothing has changed
+            return expr
 
-    def _ail_handle_CmpGTs(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpGTs', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpEQ(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
+        return Expr.BinaryOp(expr.idx, expr.op, [ operand_0, operand_1 ], expr.signed, **expr.tags)
 
-        return Expr.BinaryOp(expr.idx, 'CmpEQ', [ operand_0, operand_1 ], expr.signed, **expr.tags)
-
-    def _ail_handle_CmpNE(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
-
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(1)
-
-        return Expr.BinaryOp(expr.idx, 'CmpNE', [ operand_0, operand_1 ], expr.signed, **expr.tags)
+    _ail_handle_CmpLE = _ail_handle_Cmp
+    _ail_handle_CmpLEs = _ail_handle_Cmp
+    _ail_handle_CmpLT = _ail_handle_Cmp
+    _ail_handle_CmpLTs = _ail_handle_Cmp
+    _ail_handle_CmpGE = _ail_handle_Cmp
+    _ail_handle_CmpGEs = _ail_handle_Cmp
+    _ail_handle_CmpGT = _ail_handle_Cmp
+    _ail_handle_CmpGTs = _ail_handle_Cmp
+    _ail_handle_CmpEQ = _ail_handle_Cmp
+    _ail_handle_CmpNE = _ail_handle_Cmp
 
     def _ail_handle_Add(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
+        operand_0, operand_1 = self._eval_base_offset_operands(expr)
 
         if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(operand_0.size)
+            return get_top(operand_0.size)
 
-        if isinstance(operand_0, Expr.Const) and isinstance(operand_1, Expr.Const):
+        if type(operand_0) is Expr.Const and type(operand_1) is Expr.Const:
             return Expr.Const(expr.idx, None, operand_0.value + operand_1.value, expr.bits)
-        elif isinstance(operand_0, Expr.BasePointerOffset) and isinstance(operand_1, Expr.Const):
+        elif type(operand_0) in _BASE_POINTER_OFFSET_TYPES and type(operand_1) is Expr.Const:
             r = operand_0.copy()
             r.offset += operand_1.value
             return r
-        return Expr.BinaryOp(expr.idx, 'Add', [operand_0 if operand_0 is not None else expr.operands[0],
-                                               operand_1 if operand_1 is not None else expr.operands[1]
-                                               ],
-                             expr.signed)
+
+        if operand_0 is None:
+            operand_0 = expr.operands[0]
+        if operand_1 is None:
+            operand_1 = expr.operands[1]
+        if operand_0 is expr.operands[0] and operand_1 is expr.operands[1]:
+            # nothing has changed
+            return expr
+
+        return Expr.BinaryOp(expr.idx, 'Add', [ operand_0, operand_1 ], expr.signed)
 
     def _ail_handle_Sub(self, expr):
-        operand_0 = self._expr(expr.operands[0])
-        operand_1 = self._expr(expr.operands[1])
+        operand_0, operand_1 = self._eval_base_offset_operands(expr)
 
         if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(operand_0.size)
+            return get_top(operand_0.size)
 
-        if isinstance(operand_0, Expr.Const) and isinstance(operand_1, Expr.Const):
+        if type(operand_0) is Expr.Const and type(operand_1) is Expr.Const:
             return Expr.Const(expr.idx, None, operand_0.value - operand_1.value, expr.bits)
-        elif isinstance(operand_0, Expr.BasePointerOffset) and isinstance(operand_1, Expr.Const):
+        elif type(operand_0) in _BASE_POINTER_OFFSET_TYPES and type(operand_1) is Expr.Const:
             r = operand_0.copy()
             r.offset -= operand_1.value
             return r
-        if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(expr.bits // 8)
-        return Expr.BinaryOp(expr.idx, 'Sub', [ operand_0 if operand_0 is not None else expr.operands[0],
-                                                operand_1 if operand_1 is not None else expr.operands[1]
-                                                ],
-                             expr.signed,
-                             **expr.tags)
+
+        if operand_0 is None:
+            operand_0 = expr.operands[0]
+        if operand_1 is None:
+            operand_1 = expr.operands[1]
+        if operand_0 is expr.operands[0] and operand_1 is expr.operands[1]:
+            # nothing has changed
+            return expr
+
+        return Expr.BinaryOp(expr.idx, 'Sub', [ operand_0, operand_1 ], expr.signed, **expr.tags)
 
     def _ail_handle_StackBaseOffset(self, expr):  # pylint:disable=no-self-use
         return expr
@@ -346,46 +401,136 @@ class SimEnginePropagatorAIL(
         operand_1 = self._expr(expr.operands[1])
 
         if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(operand_0.size)
+            return get_top(operand_0.size)
+
+        if type(operand_0) is Expr.Const and type(operand_1) is Expr.Const:
+            return self._fold_consts(expr, operand_0, operand_1)
 
         # Special logic for SP alignment
         if type(operand_0) is Expr.StackBaseOffset and \
-                type(operand_1) is Expr.Const and is_alignment_mask(operand_1.value):
+                type(operand_1) is Expr.Const and operand_1.value in ALIGNMENT_MASKS:
             return operand_0
 
+        if operand_0 is expr.operands[0] and operand_1 is expr.operands[1]:
+            # nothing has changed
+            return expr
+
         return Expr.BinaryOp(expr.idx, 'And', [ operand_0, operand_1 ], expr.signed, **expr.tags)
 
-    def _ail_handle_Xor(self, expr):
+    def _ail_handle_Bitwise(self, expr):
         operand_0 = self._expr(expr.operands[0])
         operand_1 = self._expr(expr.operands[1])
 
+        if operand_0 is None:
+            operand_0 = expr.operands[0]
+        if operand_1 is None:
+            operand_1 = expr.operands[1]
+
         if type(operand_0) is Top or type(operand_1) is Top:
-            return Top(operand_0.size)
+            return get_top(operand_0.size)
+
+        if type(operand_0) is Expr.Const and type(operand_1) is Expr.Const:
+            return self._fold_consts(expr, operand_0, operand_1)
 
-        return Expr.BinaryOp(expr.idx, 'Xor', [ operand_0, operand_1 ], expr.signed, **expr.tags)
+        if operand_0 is expr.operands[0] and operand_1 is expr.operands[1]:
+            # nothing has changed
+            return expr
+
+        return Expr.BinaryOp(expr.idx, expr.op, [ operand_0, operand_1 ], expr.signed, **expr.tags)
+
+    _ail_handle_Xor = _ail_handle_Bitwise
+    _ail_handle_Shl = _ail_handle_Bitwise
+    _ail_handle_Shr = _ail_handle_Bitwise
 
     #
     # Util methods
     #
 
-    def is_using_outdated_def(self, expr: Expr.Expression) -> bool:
+    def _eval_base_offset_operands(self, expr: Expr.BinaryOp):
+        """
+        Evaluate both operands of an Add or Sub expression. Most of them are a register (usually the stack or the base
+        pointer) plus or minus a constant, so this case skips the generic expression dispatch.
+        """
 
-        from ..decompiler.ailblock_walker import AILBlockWalker  # pylint:disable=import-outside-toplevel
+        arg0, arg1 = expr.operands
+        if type(arg0) is Expr.Register and type(arg1) is Expr.Const:
+            # _ail_handle_Const() returns the constant as it is
+            return self._ail_handle_Register(arg0), arg1
+        return self._expr(arg0), self._expr(arg1)
 
-        class OutdatedDefinitionWalker(AILBlockWalker):
-            def __init__(self, state: 'PropagatorAILState'):
-                super().__init__()
-                self.state = state
-                self.expr_handlers[Expr.Register] = self._handle_Register
-                self.out_dated = False
+    def _visit_expr(self, expr) -> None:
+        """
+        Visit an expression whose propagated value is not used by the caller. Registers and tmps are handled as usual,
+        so their replacements are still recorded, but no new expression is built for any of the enclosing nodes.
 
-            # pylint:disable=unused-argument
-            def _handle_Register(self, expr_idx: int, expr: Expr.Register, stmt_idx: int, stmt: Stmt.Assignment, block: Optional[Block]):
-                v = self.state.get_variable(expr)
+        :param expr:    The expression to visit.
+        :return:        None
+        """
+
+        expr_type = type(expr)
+        if expr_type is Expr.BinaryOp:
+            if self._find_op_handler(expr.op) is not None:
+                self._visit_expr(expr.operands[0])
+                self._visit_expr(expr.operands[1])
+        elif expr_type is Expr.UnaryOp:
+            if self._find_op_handler(expr.op) is not None:
+                self._visit_expr(expr.operand)
+        elif expr_type is Expr.Convert:
+            self._visit_expr(expr.operand)
+        elif expr_type is Expr.Load:
+            self._visit_expr(expr.addr)
+        elif expr_type is Expr.ITE:
+            self._ail_handle_ITE(expr)
+        elif expr_type is Stmt.Call:
+            self._ail_handle_CallExpr(expr)
+        elif expr_type is Expr.Const or expr_type is Expr.StackBaseOffset or expr_type is Expr.DirtyExpression:
+            pass
+        else:
+            self._expr(expr)
+
+    def _fold_consts(self, expr: Expr.BinaryOp, operand_0: Expr.Const, operand_1: Expr.Const) -> Expr.Const:
+        op = expr.op
+        mask = (1 << expr.bits) - 1
+        # folded Add/Sub results may be negative. treat both operands as unsigned so that shifts are logical and shift
+        # amounts are never negative
+        value_0 = operand_0.value & mask
+        value_1 = operand_1.value & ((1 << operand_1.bits) - 1)
+        if op in ('Shl', 'Sal', 'Shr') and value_1 >= expr.bits:
+            # everything is shifted out
+            value = 0
+        else:
+            value = _CONST_FOLDERS[op](value_0, value_1)
+        return Expr.Const(expr.idx, None, value & mask, expr.bits)
+
+    def is_using_outdated_def(self, expr: Expr.Expression) -> bool:
+        """
+        Check if any register used in the given expression has been redefined since the expression was created.
+
+        :param expr:    The expression to check.
+        :return:        True if the expression relies on an outdated definition, False otherwise.
+        """
+
+        get_variable = self.state.get_variable
+        stack = [ expr ]
+        while stack:
+            expr = stack.pop()
+            expr_type = type(expr)
+            if expr_type is Expr.Register:
+                v = get_variable(expr)
                 if v is not None and isinstance(v, Expr.TaggedObject) \
                         and v.tags.get('def_at', None) != expr.tags.get('def_at', None):
-                    self.out_dated = True
-
-        walker = OutdatedDefinitionWalker(self.state)
-        walker.walk_expression(expr)
-        return walker.out_dated
+                    return True
+            elif expr_type is Expr.BinaryOp:
+                stack.extend(expr.operands)
+            elif expr_type is Expr.UnaryOp or expr_type is Expr.Convert:
+                stack.append(expr.operand)
+            elif expr_type is Expr.Load:
+                stack.append(expr.addr)
+            elif expr_type is Expr.ITE:
+                stack.append(expr.cond)
+                stack.append(expr.iftrue)
+                stack.append(expr.iffalse)
+            elif expr_type is Stmt.Call:
+                if expr.args:
+                    stack.extend(expr.args)
+        return False
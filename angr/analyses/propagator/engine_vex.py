@@ -16,18 +16,29 @@ class SimEnginePropagatorVEX(
     SimEngineLightVEXMixin,
     SimEnginePropagatorBase
 ):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        # architecture-specific constants, cached when the engine sees a new architecture
+        self._sp_offset = None
+        self._ip_offset = None
+
     #
     # Private methods
     #
 
     def _process(self, state, successors, block=None, whitelist=None, **kwargs):  # pylint:disable=arguments-differ
+        arch = state.arch
+        if arch is not self.arch:
+            self._sp_offset = arch.sp_offset
+            self._ip_offset = arch.ip_offset
 
         super()._process(state, successors, block=block, whitelist=whitelist, **kwargs)
 
         if self.block.vex.jumpkind == 'Ijk_Call':
             if self.arch.call_pushes_ret:
                 # pop ret from the stack
-                sp_offset = self.arch.sp_offset
+                sp_offset = self._sp_offset
                 sp_value = state.load_register(sp_offset, self.arch.bytes)
                 if sp_value is not None:
                     state.store_register(sp_offset, self.arch.bytes, sp_value + self.arch.bytes)
@@ -35,7 +46,8 @@ class SimEnginePropagatorVEX(
         return state
 
     def _allow_loading(self, addr, size):
-        if type(addr) in (Top, Bottom):
+        addr_type = type(addr)
+        if addr_type is Top or addr_type is Bottom:
             return False
         if self._load_callback is None:
             return True
@@ -44,10 +56,12 @@ class SimEnginePropagatorVEX(
     def _expr(self, expr):
         v = super()._expr(expr)
 
-        if v is not None and type(v) not in {Bottom, Top} and v is not expr:
-            # Record the replacement
-            if type(expr) is pyvex.IRExpr.Get:
-                if expr.offset not in (self.arch.sp_offset, self.arch.ip_offset, ):
+        if v is not None and v is not expr and type(expr) is pyvex.IRExpr.Get:
+            v_type = type(v)
+            if v_type is not Top and v_type is not Bottom:
+                # Record the replacement
+                offset = expr.offset
+                if offset != self._sp_offset and offset != self._ip_offset:
                     self.state.add_replacement(self._codeloc(block_only=True),
                                                VEXReg(expr.offset, expr.result_size(self.tyenv) // 8),
                                                v)
@@ -196,7 +210,10 @@ class SimEnginePropagatorVEX(
 
     def _handle_Load(self, expr):
         addr = self._expr(expr.addr)
-        if addr is None or type(addr) in (Top, Bottom):
+        if addr is None:
+            return None
+        addr_type = type(addr)
+        if addr_type is Top or addr_type is Bottom:
             return None
         size = expr.result_size(self.tyenv) // self.arch.byte_width
         return self._load_data(addr, size, expr.endness)
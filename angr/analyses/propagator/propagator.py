@@ -11,7 +11,7 @@ from ...code_location import CodeLocation  # pylint:disable=unused-import
 from .. import register_analysis
 from ..analysis import Analysis
 from ..forward_analysis import ForwardAnalysis, FunctionGraphVisitor, SingleNodeGraphVisitor
-from .values import Top
+from .values import Top, get_top
 from .engine_vex import SimEnginePropagatorVEX
 from .engine_ail import SimEnginePropagatorAIL
 
@@ -21,6 +21,10 @@ _l = logging.getLogger(name=__name__)
 # The base state
 
 class PropagatorState:
+
+    __slots__ = ('arch', 'gpr_size', '_prop_count', '_only_consts', '_replacements', '_equivalence', '_shared',
+                 '_prop_count_shared', '_private_locs', )
+
     def __init__(self, arch, replacements=None, only_consts=False, prop_count=None, equivalence=None):
         self.arch = arch
         self.gpr_size = arch.bits // arch.byte_width  # size of the general-purpose registers
@@ -30,6 +34,14 @@ class PropagatorState:
         self._only_consts = only_consts
         self._replacements = defaultdict(dict) if replacements is None else replacements
         self._equivalence: Set[Equivalence] = equivalence if equivalence is not None else set()
+        # copy-on-write: True if _replacements and _equivalence may be shared with other states
+        self._shared = False
+        # copy-on-write: True if _prop_count may be shared with other states. it is tracked separately since most
+        # replacements never update the propagation count.
+        self._prop_count_shared = False
+        # code locations whose replacement dicts are only referenced by this state. the replacement dicts of all other
+        # code locations may be shared with other states.
+        self._private_locs = set()
 
     def __repr__(self):
         return "<PropagatorState>"
@@ -37,21 +49,56 @@ class PropagatorState:
     def copy(self) -> 'PropagatorState':
         raise NotImplementedError()
 
+    def _unshare(self) -> None:
+        """
+        Make private copies of the containers that self._shared covers. Must be called before modifying any of them
+        when self._shared is True.
+
+        :return:    None
+        """
+
+        self._replacements = self._replacements.copy()
+        self._equivalence = self._equivalence.copy()
+        self._shared = False
+        self._private_locs = set()
+
+    def _replacements_at(self, codeloc) -> dict:
+        """
+        Get the replacement dict of a code location for modification. The dict is copied first if it may be shared with
+        other states. self._shared must be False.
+
+        :param CodeLocation codeloc:    The code location.
+        :return:                        The replacement dict of the code location.
+        """
+
+        if codeloc in self._private_locs:
+            return self._replacements[codeloc]
+        vars_ = self._replacements.get(codeloc, None)
+        vars_ = { } if vars_ is None else vars_.copy()
+        self._replacements[codeloc] = vars_
+        self._private_locs.add(codeloc)
+        return vars_
+
     def merge(self, *others):
 
         state = self.copy()
+        if not others:
+            return state
+        state._unshare()
 
         for o in others:
             for loc, vars_ in o._replacements.items():
                 if loc not in state._replacements:
-                    state._replacements[loc] = vars_.copy()
+                    # shared until either state modifies it
+                    state._replacements[loc] = vars_
                 else:
+                    state_vars = state._replacements[loc]
                     for var, repl in vars_.items():
-                        if var not in state._replacements[loc]:
-                            state._replacements[loc][var] = repl
+                        if var not in state_vars:
+                            state._replacements_at(loc)[var] = repl
                         else:
-                            if state._replacements[loc][var] != repl:
-                                state._replacements[loc][var] = Top(1)
+                            if state_vars[var] != repl:
+                                state._replacements_at(loc)[var] = get_top(1)
             state._equivalence |= o._equivalence
 
         return state
@@ -66,11 +113,25 @@ class PropagatorState:
         :param new:                     The expression to replace with.
         :return:                        None
         """
+        if self._shared:
+            self._unshare()
         if self._only_consts:
             if isinstance(new, int) or type(new) is Top:
-                self._replacements[codeloc][old] = new
+                self._replacements_at(codeloc)[old] = new
         else:
-            self._replacements[codeloc][old] = new
+            self._replacements_at(codeloc)[old] = new
+
+    def add_replacements(self, replacements):
+        """
+        Add multiple replacement records in order. See add_replacement() for details.
+
+        :param replacements:    An iterable of (codeloc, old, new) tuples.
+        :return:                None
+        """
+
+        add_replacement = self.add_replacement
+        for codeloc, old, new in replacements:
+            add_replacement(codeloc, old, new)
 
     def filter_replacements(self):
         pass
@@ -79,6 +140,9 @@ class PropagatorState:
 # VEX state
 
 class PropagatorVEXState(PropagatorState):
+
+    __slots__ = ('registers', 'local_variables', )
+
     def __init__(self, arch, registers=None, local_variables=None, replacements=None, only_consts=False,
                  prop_count=None):
         super().__init__(arch, replacements=replacements, only_consts=only_consts, prop_count=prop_count)
@@ -89,14 +153,15 @@ class PropagatorVEXState(PropagatorState):
         return "<PropagatorVEXState>"
 
     def copy(self):
+        # propagation counts are only used by AIL states, so VEX states do not carry them over
         cp = PropagatorVEXState(
             self.arch,
             registers=self.registers.copy(),
             local_variables=self.local_variables.copy(),
-            replacements=self._replacements.copy(),
-            prop_count=self._prop_count.copy(),
+            replacements=self._replacements,
             only_consts=self._only_consts
         )
+        self._shared = cp._shared = True
 
         return cp
 
@@ -108,14 +173,14 @@ class PropagatorVEXState(PropagatorState):
                     state.registers[offset] = value
                 else:
                     if state.registers[offset] != value:
-                        state.registers[offset] = Top(self.arch.bytes)
+                        state.registers[offset] = get_top(self.arch.bytes)
 
             for offset, value in other.local_variables.items():
                 if offset not in state.local_variables:
                     state.local_variables[offset] = value
                 else:
                     if state.local_variables[offset] != value:
-                        state.local_variables[offset] = Top(self.arch.bytes)
+                        state.local_variables[offset] = get_top(self.arch.bytes)
 
         return state
 
@@ -128,7 +193,7 @@ class PropagatorVEXState(PropagatorState):
         try:
             return self.local_variables[offset]
         except KeyError:
-            return Top(size)
+            return get_top(size)
 
     def store_register(self, offset, size, value):
         if size != self.gpr_size:
@@ -140,72 +205,137 @@ class PropagatorVEXState(PropagatorState):
 
         # TODO: Fix me
         if size != self.gpr_size:
-            return Top(size)
+            return get_top(size)
 
         try:
             return self.registers[offset]
         except KeyError:
-            return Top(size)
+            return get_top(size)
 
 
 # AIL state
 
 
 class Equivalence:
-    __slots__ = ('codeloc', 'atom0', 'atom1',)
+    __slots__ = ('codeloc', 'atom0', 'atom1', '_hash', )
 
     def __init__(self, codeloc, atom0, atom1):
         self.codeloc = codeloc
         self.atom0 = atom0
         self.atom1 = atom1
+        # equivalences are never modified after creation
+        self._hash = hash((Equivalence, codeloc, atom0, atom1))
 
     def __repr__(self):
         return "<Eq@%r: %r==%r>" % (self.codeloc, self.atom0, self.atom1)
 
     def __eq__(self, other):
-        return type(other) is Equivalence \
-               and other.codeloc == self.codeloc \
-               and other.atom0 == self.atom0 \
-               and other.atom1 == self.atom1
+        return self is other or (
+            type(other) is Equivalence
+            and other._hash == self._hash
+            and other.codeloc == self.codeloc
+            and other.atom0 == self.atom0
+            and other.atom1 == self.atom1
+        )
 
     def __hash__(self):
-        return hash((Equivalence, self.codeloc, self.atom0, self.atom1))
+        return self._hash
 
 
 class PropagatorAILState(PropagatorState):
-    def __init__(self, arch, replacements=None, only_consts=False, prop_count=None, equivalence=None):
+
+    __slots__ = ('_replacement_locs', '_replacement_olds', '_stack_variables', '_registers', '_stack_variables_shared',
+                 '_registers_shared', '_pending_stores', '_tmps', )
+
+    def __init__(self, arch, replacements=None, only_consts=False, prop_count=None, equivalence=None,
+                 replacement_locs=None, replacement_olds=None):
         super().__init__(arch, replacements=replacements, only_consts=only_consts, prop_count=prop_count,
                          equivalence=equivalence)
 
+        # reverse index of self._replacements: expression to be replaced -> code locations where it may be replaced.
+        # it may contain stale code locations, but it always covers every replacement that exists.
+        if replacement_locs is None:
+            replacement_locs = defaultdict(set)
+            for codeloc, vars_ in self._replacements.items():
+                for old in vars_:
+                    replacement_locs[old].add(codeloc)
+        self._replacement_locs = replacement_locs
+        # counted expression to replace with -> expressions that may be replaced with it. like the index above, it may
+        # be stale, but it always covers every such replacement that exists.
+        if replacement_olds is None:
+            replacement_olds = defaultdict(set)
+            for vars_ in self._replacements.values():
+                for old, new in vars_.items():
+                    if self._is_counted(old, new):
+                        replacement_olds[new].add(old)
+        self._replacement_olds = replacement_olds
+
         self._stack_variables = KeyedRegion()
         self._registers = KeyedRegion()
+        # copy-on-write: True if the keyed region may be shared with other states
+        self._stack_variables_shared = False
+        self._registers_shared = False
+        # stack stores that have not been written to self._stack_variables yet: offset -> (size, value), in the order
+        # they were made
+        self._pending_stores = {}
         self._tmps = {}
 
     def __repr__(self):
         return "<PropagatorAILState>"
 
     def copy(self):
+        self.flush_pending_stores()
         rd = PropagatorAILState(
             self.arch,
-            replacements=self._replacements.copy(),
-            prop_count=self._prop_count.copy(),
+            replacements=self._replacements,
+            prop_count=self._prop_count,
             only_consts=self._only_consts,
-            equivalence=self._equivalence.copy(),
+            equivalence=self._equivalence,
+            replacement_locs=self._replacement_locs,
+            replacement_olds=self._replacement_olds,
         )
+        self._shared = rd._shared = True
+        self._prop_count_shared = rd._prop_count_shared = True
 
-        rd._stack_variables = self._stack_variables.copy()
-        rd._registers = self._registers.copy()
+        rd._stack_variables = self._stack_variables
+        rd._registers = self._registers
+        self._stack_variables_shared = rd._stack_variables_shared = True
+        self._registers_shared = rd._registers_shared = True
         # drop tmps
 
         return rd
 
+    def _unshare(self) -> None:
+        self._replacement_locs = self._replacement_locs.copy()
+        self._replacement_olds = self._replacement_olds.copy()
+        super()._unshare()
+
     def merge(self, *others) -> 'PropagatorAILState':
         # TODO:
         state = super().merge(*others)
 
+        if others:
+            if state._stack_variables_shared:
+                state._stack_variables = state._stack_variables.copy()
+                state._stack_variables_shared = False
+            if state._registers_shared:
+                state._registers = state._registers.copy()
+                state._registers_shared = False
+
         for o in others:
-            state._stack_variables.merge_to_top(o._stack_variables, top=Top(1))
-            state._registers.merge_to_top(o._registers, top=(Top(1), None))
+            o.flush_pending_stores()
+            for old, codelocs in o._replacement_locs.items():
+                if old in state._replacement_locs:
+                    state._replacement_locs[old] = state._replacement_locs[old] | codelocs
+                else:
+                    state._replacement_locs[old] = codelocs
+            for new, olds in o._replacement_olds.items():
+                if new in state._replacement_olds:
+                    state._replacement_olds[new] = state._replacement_olds[new] | olds
+                else:
+                    state._replacement_olds[new] = olds
+            state._stack_variables.merge_to_top(o._stack_variables, top=get_top(1))
+            state._registers.merge_to_top(o._registers, top=(get_top(1), None))
 
         return state
 
@@ -215,27 +345,61 @@ class PropagatorAILState(PropagatorState):
         if type(new) is not Top and new.has_atom(old, identity=False):
             return
 
-        if isinstance(old, ailment.Expr.Tmp):
+        if type(old) is ailment.Expr.Tmp:
             self._tmps[old.tmp_idx] = new
-        elif isinstance(old, ailment.Expr.Register):
+        elif type(old) is ailment.Expr.Register:
+            if self._registers_shared:
+                self._registers = self._registers.copy()
+                self._registers_shared = False
             self._registers.set_object(old.reg_offset, (new, def_at), old.size)
         else:
             _l.warning("Unsupported old variable type %s.", type(old))
 
     def store_stack_variable(self, addr, size, new, endness=None) -> None:  # pylint:disable=unused-argument
-        if isinstance(addr, ailment.Expr.StackBaseOffset):
+        if type(addr) is ailment.Expr.StackBaseOffset:
             if addr.offset is None:
                 offset = 0
             else:
                 offset = addr.offset
-            self._stack_variables.set_object(offset, new, size)
+            pending = self._pending_stores
+            if type(size) is not int:
+                # unknown sizes are left to the keyed region
+                self.flush_pending_stores()
+                self._store_stack_object(offset, new, size)
+                return
+            if offset in pending:
+                if pending[offset][0] == size:
+                    # this store fully hides the previous one. move it to the end to keep the order of stores
+                    del pending[offset]
+                else:
+                    self.flush_pending_stores()
+            pending[offset] = (size, new)
         else:
             _l.warning("Unsupported addr type %s.", type(addr))
 
+    def _store_stack_object(self, offset, new, size) -> None:
+        if self._stack_variables_shared:
+            self._stack_variables = self._stack_variables.copy()
+            self._stack_variables_shared = False
+        self._stack_variables.set_object(offset, new, size)
+
+    def flush_pending_stores(self) -> None:
+        """
+        Write all pending stack stores to the stack variable region, in the order they were made.
+
+        :return:    None
+        """
+
+        if not self._pending_stores:
+            return
+        for offset, (size, new) in self._pending_stores.items():
+            self._store_stack_object(offset, new, size)
+        self._pending_stores.clear()
+
     def get_variable(self, variable) -> Any:
-        if isinstance(variable, ailment.Expr.Tmp):
+        if type(variable) is ailment.Expr.Tmp:
             return self._tmps.get(variable.tmp_idx, None)
-        elif isinstance(variable, ailment.Expr.Register):
+        elif type(variable) is ailment.Expr.Register:
             objs = self._registers.get_objects_by_offset(variable.reg_offset)
             if not objs:
                 return None
@@ -246,12 +410,12 @@ class PropagatorAILState(PropagatorState):
             if type(first_obj) is Top:
                 # return a Top
                 if first_obj.bits != variable.bits:
-                    return Top(variable.bits // 8)
+                    return get_top(variable.bits // 8)
                 return first_obj
 
             if first_obj.bits != variable.bits:
                 # conversion is needed
-                if isinstance(first_obj, ailment.Expr.Convert):
+                if type(first_obj) is ailment.Expr.Convert:
                     if variable.bits == first_obj.operand.bits:
                         first_obj = first_obj.operand
                     else:
@@ -266,7 +430,9 @@ class PropagatorAILState(PropagatorState):
         return None
 
     def get_stack_variable(self, addr, size, endness=None):  # pylint:disable=unused-argument
-        if isinstance(addr, ailment.Expr.StackBaseOffset):
+        if type(addr) is ailment.Expr.StackBaseOffset:
+            if self._pending_stores:
+                self.flush_pending_stores()
             objs = self._stack_variables.get_objects_by_offset(addr.offset)
             if not objs:
                 return None
@@ -275,48 +441,109 @@ class PropagatorAILState(PropagatorState):
 
     def add_replacement(self, codeloc, old, new):
 
-        if isinstance(new, ailment.statement.Call):
+        if type(new) is ailment.statement.Call:
             # do not replace anything with a call expression
             return
 
         if type(new) is Top:
             # eliminate the past propagation of this expression
             if codeloc in self._replacements and old in self._replacements[codeloc]:
-                del self._replacements[codeloc][old]
+                if self._shared:
+                    self._unshare()
+                del self._replacements_at(codeloc)[old]
             return
 
+        if self._shared:
+            self._unshare()
+
         prop_count = 0
-        if not isinstance(old, ailment.Expr.Tmp) and isinstance(new, ailment.Expr.Expression) \
-                and not isinstance(new, ailment.Expr.Const):
-            self._prop_count[new] += 1
-            prop_count = self._prop_count[new]
+        counted = self._is_counted(old, new)
+        if counted:
+            # only "once" and "more than once" matter, so the count saturates at 2
+            prop_count = self._prop_count.get(new, 0)
+            if prop_count < 2:
+                prop_count += 1
+                if self._prop_count_shared:
+                    self._prop_count = self._prop_count.copy()
+                    self._prop_count_shared = False
+                self._prop_count[new] = prop_count
 
         if prop_count <= 1:
-            # we can propagate this expression
-            super().add_replacement(codeloc, old, new)
+            # we can propagate this expression. this inlines PropagatorState.add_replacement(), and Top values have
+            # been handled above.
+            if self._only_consts and not isinstance(new, int):
+                return
+            self._replacements_at(codeloc)[old] = new
+            # the sets in both indices may be shared with other states, so they are replaced instead of modified
+            locs = self._replacement_locs.get(old, None)
+            if locs is None:
+                self._replacement_locs[old] = {codeloc}
+            elif codeloc not in locs:
+                self._replacement_locs[old] = locs | {codeloc}
+            if counted:
+                olds = self._replacement_olds.get(new, None)
+                if olds is None:
+                    self._replacement_olds[new] = {old}
+                elif old not in olds:
+                    self._replacement_olds[new] = olds | {old}
         else:
             # eliminate the past propagation of this expression
-            for codeloc_ in self._replacements:
-                if old in self._replacements[codeloc_]:
-                    del self._replacements[codeloc_][old]
+            for codeloc_ in self._replacement_locs.pop(old, ()):
+                vars_ = self._replacements.get(codeloc_, None)
+                if vars_ is not None and old in vars_:
+                    del self._replacements_at(codeloc_)[old]
+
+    @staticmethod
+    def _is_counted(old, new) -> bool:
+        """
+        Check if replacing `old` with `new` counts as a propagation of `new`. Only expressions that are propagated at
+        most once may be replaced with.
+        """
+        return type(old) is not ailment.Expr.Tmp and isinstance(new, ailment.Expr.Expression) \
+            and type(new) is not ailment.Expr.Const
 
     def filter_replacements(self):
+        """
+        Remove all replacements with an expression that has been propagated more than once.
 
-        to_remove = set()
+        :return:    None
+        """
 
-        for old, new in self._replacements.items():
-            if isinstance(new, ailment.Expr.Expression) and not isinstance(new, ailment.Expr.Const):
-                if self._prop_count[new] > 1:
-                    # do not propagate this expression
-                    to_remove.add(old)
+        to_remove = [ new for new in self._replacement_olds if self._prop_count.get(new, 0) > 1 ]
+        if not to_remove:
+            return
 
-        for old in to_remove:
-            del self._replacements[old]
+        if self._shared:
+            self._unshare()
+        for new in to_remove:
+            # do not propagate this expression
+            for old in self._replacement_olds.pop(new):
+                for codeloc in self._replacement_locs.get(old, ()):
+                    vars_ = self._replacements.get(codeloc, None)
+                    if vars_ is None:
+                        continue
+                    repl = vars_.get(old, None)
+                    if repl is not None and type(repl) is not Top and repl == new:
+                        del self._replacements_at(codeloc)[old]
 
     def add_equivalence(self, codeloc, old, new):
+        if self._shared:
+            self._unshare()
         eq = Equivalence(codeloc, old, new)
         self._equivalence.add(eq)
 
+    def add_equivalences(self, equivalences):
+        """
+        Add multiple equivalence records.
+
+        :param equivalences:    An iterable of (codeloc, old, new) tuples.
+        :return:                None
+        """
+
+        if self._shared:
+            self._unshare()
+        self._equivalence.update(Equivalence(codeloc, old, new) for codeloc, old, new in equivalences)
+
 
 class PropagatorAnalysis(ForwardAnalysis, Analysis):  # pylint:disable=abstract-method
     """
@@ -343,9 +570,12 @@ class PropagatorAnalysis(ForwardAnalysis, Analysis):  # pylint:disable=abstract-
                 raise ValueError('You cannot specify both "func" and "block".')
             # traversing a function
             graph_visitor = FunctionGraphVisitor(func, func_graph)
+            # all nodes of a graph are either AIL blocks or VEX block nodes
+            is_ail = isinstance(next(iter(graph_visitor.graph), None), ailment.Block)
         elif block is not None:
             # traversing a block
             graph_visitor = SingleNodeGraphVisitor(block)
+            is_ail = isinstance(block, ailment.Block)
         else:
             raise ValueError('Unsupported analysis target.')
 
@@ -362,8 +592,13 @@ class PropagatorAnalysis(ForwardAnalysis, Analysis):  # pylint:disable=abstract-
 
         self._node_iterations = defaultdict(int)
         self._states = {}
-        self.replacements: Optional[defaultdict] = None
-        self.equivalence: Set[Equivalence] = set()
+        self._block_cache = {}  # lifted VEX blocks, since each node may be visited more than once
+        self._replacements: Optional[defaultdict] = None
+        # replacement tables of processed blocks that have not been folded into self._replacements yet
+        self._replacement_chunks = [ ]
+        self._equivalence: Set[Equivalence] = set()
+        # equivalence sets of processed blocks that have not been folded into self._equivalence yet
+        self._equivalence_chunks = [ ]
 
         self._engine_vex = SimEnginePropagatorVEX(project=self.project)
         self._engine_ail = SimEnginePropagatorAIL(
@@ -371,21 +606,63 @@ class PropagatorAnalysis(ForwardAnalysis, Analysis):  # pylint:disable=abstract-
             # We only propagate tmps within the same block. This is because the lifetime of tmps is one block only.
             propagate_tmps=block is not None,
         )
+        self._is_ail = is_ail
+        self._engine = self._engine_ail if is_ail else self._engine_vex
 
         self._analyze()
 
+    @property
+    def replacements(self) -> Optional[defaultdict]:
+        """
+        All replacements found so far, or None if no block has been processed. Replacement tables of processed blocks
+        are only folded into it upon access.
+        """
+
+        if self._replacement_chunks:
+            if self._replacements is None:
+                self._replacements = defaultdict(dict)
+            for chunk in self._replacement_chunks:
+                self._replacements.update(chunk)
+            self._replacement_chunks = [ ]
+        return self._replacements
+
+    @replacements.setter
+    def replacements(self, v):
+        self._replacements = v
+        self._replacement_chunks = [ ]
+
+    @property
+    def equivalence(self) -> Set[Equivalence]:
+        """
+        All equivalences found so far. Like replacements, equivalences of processed blocks are only folded into it
+        upon access.
+        """
+
+        if self._equivalence_chunks:
+            self._equivalence.update(*self._equivalence_chunks)
+            self._equivalence_chunks = [ ]
+        return self._equivalence
+
+    @equivalence.setter
+    def equivalence(self, v):
+        self._equivalence = v
+        self._equivalence_chunks = [ ]
+
     #
     # Main analysis routines
     #
 
     def _pre_analysis(self):
-        pass
+        # Suppress spurious output
+        if self._base_state is not None:
+            self._base_state.options.add(sim_options.SYMBOL_FILL_UNCONSTRAINED_REGISTERS)
+            self._base_state.options.add(sim_options.SYMBOL_FILL_UNCONSTRAINED_MEMORY)
 
     def _pre_job_handling(self, job):
         pass
 
     def _initial_abstract_state(self, node):
-        if isinstance(node, ailment.Block):
+        if self._is_ail:
             # AIL
             state = PropagatorAILState(arch=self.project.arch, only_consts=self._only_consts)
         else:
@@ -398,40 +675,38 @@ class PropagatorAnalysis(ForwardAnalysis, Analysis):  # pylint:disable=abstract-
         return state
 
     def _merge_states(self, node, *states):
+        if len(self._graph_visitor.predecessors(node)) == 1:
+            # all states come from the same predecessor, and the latest one supersedes the others
+            return states[-1]
         return states[0].merge(*states[1:])
 
     def _run_on_node(self, node, state):
 
-        if isinstance(node, ailment.Block):
+        if self._is_ail:
             block = node
             block_key = (node.addr, node.idx)
-            engine = self._engine_ail
         else:
-            block = self.project.factory.block(node.addr, node.size, opt_level=1, cross_insn_opt=False)
             block_key = node.addr
-            engine = self._engine_vex
+            block = self._block_cache.get((node.addr, node.size), None)
+            if block is None:
+                block = self.project.factory.block(node.addr, node.size, opt_level=1, cross_insn_opt=False)
+                self._block_cache[(node.addr, node.size)] = block
             if block.size == 0:
                 # maybe the block is not decodeable
                 return False, state
 
         state = state.copy()
-        # Suppress spurious output
-        if self._base_state is not None:
-            self._base_state.options.add(sim_options.SYMBOL_FILL_UNCONSTRAINED_REGISTERS)
-            self._base_state.options.add(sim_options.SYMBOL_FILL_UNCONSTRAINED_MEMORY)
-        state = engine.process(state, block=block, project=self.project, base_state=self._base_state,
-                               load_callback=self._load_callback, fail_fast=self._fail_fast)
+        state = self._engine.process(state, block=block, project=self.project, base_state=self._base_state,
+                                     load_callback=self._load_callback, fail_fast=self._fail_fast)
         state.filter_replacements()
 
         self._node_iterations[block_key] += 1
         self._states[block_key] = state
 
-        if self.replacements is None:
-            self.replacements = state._replacements
-        else:
-            self.replacements.update(state._replacements)
+        self._replacement_chunks.append(state._replacements)
 
-        self.equivalence |= state._equivalence
+        if state._equivalence:
+            self._equivalence_chunks.append(state._equivalence)
 
         # TODO: Clear registers according to calling conventions
 
@@ -467,6 +742,8 @@ class PropagatorAnalysis(ForwardAnalysis, Analysis):  # pylint:disable=abstract-
         We add the current propagation replacements result to the kb if the
         function has already been completed in cfg creation.
         """
+        self._block_cache.clear()
+
         if self._function is not None:
             if self._check_func_complete(self._function):
                 func_loc = CodeLocation(self._function.addr, None)
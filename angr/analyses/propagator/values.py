@@ -95,6 +95,26 @@ class Top:
         return hash((Top, self.size))
 
 
+_TOP_BY_SIZE = { }
+
+
+def get_top(size):
+    """
+    Get a Top value of the given size. Top values are never modified, so one instance is shared for each size.
+
+    :param int size:    Size of the value in bytes.
+    :return:            The Top instance.
+    :rtype:             Top
+    """
+
+    try:
+        return _TOP_BY_SIZE[size]
+    except KeyError:
+        top = Top(size)
+        _TOP_BY_SIZE[size] = top
+        return top
+
+
 class Bottom:
     def __add__(self, other):
         return self
@@ -1,6 +1,8 @@
 
 DEFAULT_STATEMENT = -2
 
+ALIGNMENT_MASKS = frozenset({0xffffffffffffffe0, 0xfffffffffffffff0, 0xfffffff0, 0xfffffffc})
+
 
 def is_alignment_mask(n):
-    return n in {0xffffffffffffffe0, 0xfffffffffffffff0, 0xfffffff0, 0xfffffffc}
+    return n in ALIGNMENT_MASKS
@@ -0,0 +1,297 @@
+
+import nose.tools
+
+import angr
+import ailment
+from angr.keyed_region import KeyedRegion
+from angr.code_location import CodeLocation
+from angr.analyses.propagator.propagator import PropagatorAILState
+
+
+def _propagate_block(block):
+    p = angr.load_shellcode(b"\xc3", "AMD64")
+    prop = p.analyses.Propagator(block=block)
+    return list(prop._states.values())[0]
+
+
+def _replaced_values(state):
+    return [ v for reps in state._replacements.values() for v in reps.values() ]
+
+
+def test_constant_folding_bitwise():
+    arch = angr.load_shellcode(b"\xc3", "AMD64").arch
+    rax = arch.registers['rax'][0]
+    rbx = arch.registers['rbx'][0]
+    rcx = arch.registers['rcx'][0]
+
+    block = ailment.Block(0x1337, 10)
+    block.statements.extend(
+        [
+            ailment.Assignment(
+                0,
+                ailment.Register(1, None, rax, 64),
+                ailment.Expr.BinaryOp(2, 'Xor', [ ailment.Const(3, None, 0xf0, 64),
+                                                  ailment.Const(4, None, 0xff, 64) ], False),
+                ins_addr=0x1337,
+            ),  # rax = 0xf0 ^ 0xff
+            ailment.Assignment(
+                5,
+                ailment.Register(6, None, rbx, 64),
+                ailment.Expr.BinaryOp(7, 'Shl', [ ailment.Register(8, None, rax, 64),
+                                                  ailment.Const(9, None, 4, 8) ], False),
+                ins_addr=0x1338,
+            ),  # rbx = rax << 4
+            ailment.Assignment(
+                10,
+                ailment.Register(11, None, rcx, 64),
+                ailment.Register(12, None, rbx, 64),
+                ins_addr=0x1339,
+            ),  # rcx = rbx
+        ]
+    )
+
+    state = _propagate_block(block)
+    values = [ v.value for v in _replaced_values(state) if type(v) is ailment.Const ]
+    nose.tools.assert_in(0x0f, values)
+    nose.tools.assert_in(0xf0, values)
+
+
+def test_constant_folding_shift_negative_operands():
+    arch = angr.load_shellcode(b"\xc3", "AMD64").arch
+    rax = arch.registers['rax'][0]
+    rbx = arch.registers['rbx'][0]
+    rcx = arch.registers['rcx'][0]
+    rdx = arch.registers['rdx'][0]
+    rsi = arch.registers['rsi'][0]
+
+    block = ailment.Block(0x1337, 10)
+    block.statements.extend(
+        [
+            ailment.Assignment(
+                0,
+                ailment.Register(1, None, rax, 64),
+                ailment.Expr.BinaryOp(2, 'Sub', [ ailment.Const(3, None, 0, 64),
+                                                  ailment.Const(4, None, 16, 64) ], False),
+                ins_addr=0x1337,
+            ),  # rax = 0 - 16
+            ailment.Assignment(
+                5,
+                ailment.Register(6, None, rbx, 64),
+                ailment.Expr.BinaryOp(7, 'Shr', [ ailment.Register(8, None, rax, 64),
+                                                  ailment.Const(9, None, 4, 8) ], False),
+                ins_addr=0x1338,
+            ),  # rbx = rax >> 4
+            ailment.Assignment(
+                10,
+                ailment.Register(11, None, rcx, 64),
+                ailment.Register(12, None, rbx, 64),
+                ins_addr=0x1339,
+            ),  # rcx = rbx
+            ailment.Assignment(
+                13,
+                ailment.Register(14, None, rdx, 64),
+                ailment.Expr.BinaryOp(15, 'Shl', [ ailment.Const(16, None, 1, 64),
+                                                   ailment.Register(17, None, rax, 64) ], False),
+                ins_addr=0x133a,
+            ),  # rdx = 1 << rax
+            ailment.Assignment(
+                18,
+                ailment.Register(19, None, rsi, 64),
+                ailment.Register(20, None, rdx, 64),
+                ins_addr=0x133b,
+            ),  # rsi = rdx
+        ]
+    )
+
+    state = _propagate_block(block)
+    values = [ v.value for v in _replaced_values(state) if type(v) is ailment.Const ]
+    # logical shift of 0xfffffffffffffff0
+    nose.tools.assert_in(0x0fffffffffffffff, values)
+    # the shift amount 0xfffffffffffffff0 shifts everything out
+    nose.tools.assert_in(0, values)
+
+
+def test_filter_expressions_propagated_more_than_once():
+    arch = angr.load_shellcode(b"\xc3", "AMD64").arch
+    rax = arch.registers['rax'][0]
+    rbx = arch.registers['rbx'][0]
+    rcx = arch.registers['rcx'][0]
+    rdi = arch.registers['rdi'][0]
+
+    block = ailment.Block(0x1337, 10)
+    block.statements.extend(
+        [
+            ailment.Assignment(
+                0,
+                ailment.Register(1, None, rax, 64),
+                ailment.Register(2, None, rdi, 64),
+                ins_addr=0x1337,
+            ),  # rax = rdi
+            ailment.Assignment(
+                3,
+                ailment.Register(4, None, rbx, 64),
+                ailment.Register(5, None, rax, 64),
+                ins_addr=0x1338,
+            ),  # rbx = rax
+            ailment.Assignment(
+                6,
+                ailment.Register(7, None, rcx, 64),
+                ailment.Register(8, None, rbx, 64),
+                ins_addr=0x1339,
+            ),  # rcx = rbx
+        ]
+    )
+
+    state = _propagate_block(block)
+    # rdi is propagated twice (to rbx and to rcx), so neither rax nor rbx should be replaced with it
+    for v in _replaced_values(state):
+        nose.tools.assert_false(type(v) is ailment.Expr.Register and v.reg_offset == rdi)
+
+
+def _check_stack_loads(stores, loads):
+    """
+    Store to the stack and load the values back within a single block, and check that the propagator sees the same
+    values as a keyed region that is written store by store.
+
+    :param stores:  A list of (stack offset, value, bits) tuples.
+    :param loads:   A list of (stack offset, size in bytes, expected value) tuples.
+    """
+
+    block = ailment.Block(0x1337, 10)
+    ins_addr = 0x1337
+    for offset, value, bits in stores:
+        block.statements.append(
+            ailment.Stmt.Store(len(block.statements),
+                               ailment.Expr.StackBaseOffset(None, 64, offset),
+                               ailment.Const(None, None, value, bits),
+                               bits // 8,
+                               'Iend_LE',
+                               ins_addr=ins_addr,
+                               )
+        )
+        ins_addr += 1
+    for tmp_idx, (offset, size, _) in enumerate(loads):
+        block.statements.append(
+            ailment.Assignment(len(block.statements),
+                               ailment.Tmp(None, None, tmp_idx, 64),
+                               ailment.Expr.Load(None, ailment.Expr.StackBaseOffset(None, 64, offset), size, 'Iend_LE'),
+                               ins_addr=ins_addr,
+                               )
+        )
+        ins_addr += 1
+
+    state = _propagate_block(block)
+
+    unbuffered = KeyedRegion()
+    for offset, value, bits in stores:
+        unbuffered.set_object(offset, ailment.Const(None, None, value, bits), bits // 8)
+
+    for tmp_idx, (offset, _, expected) in enumerate(loads):
+        loaded = state.get_variable(ailment.Tmp(None, None, tmp_idx, 64))
+        unbuffered_loaded = next(iter(unbuffered.get_objects_by_offset(offset)))
+        nose.tools.assert_equal(loaded.value, unbuffered_loaded.value)
+        nose.tools.assert_equal(loaded.value, expected)
+
+
+def test_stack_store_same_slot_twice():
+    _check_stack_loads(
+        [ (-8, 1, 64), (-8, 2, 64) ],
+        [ (-8, 8, 2) ],
+    )
+
+
+def test_stack_store_narrower_inside_wider():
+    _check_stack_loads(
+        [ (-16, 0x11, 64), (-12, 0x22, 32) ],
+        [ (-16, 8, 0x11), (-14, 2, 0x11), (-12, 4, 0x22), (-10, 2, 0x22) ],
+    )
+
+
+def test_stack_load_inside_pending_store():
+    _check_stack_loads(
+        [ (-16, 3, 64), (-8, 4, 64) ],
+        [ (-12, 4, 3), (-4, 4, 4) ],
+    )
+
+
+def test_state_copy_on_write():
+    arch = angr.load_shellcode(b"\xc3", "AMD64").arch
+    rax = ailment.Register(None, None, arch.registers['rax'][0], 64)
+    rbx = ailment.Register(None, None, arch.registers['rbx'][0], 64)
+    rdi = ailment.Register(None, None, arch.registers['rdi'][0], 64)
+    sp_8 = ailment.Expr.StackBaseOffset(None, 64, -8)
+    loc0 = CodeLocation(0x1337, 0)
+    loc1 = CodeLocation(0x1338, 0)
+
+    src = PropagatorAILState(arch)
+    src.store_variable(rax, ailment.Const(None, None, 1, 64), loc0)
+    src.store_stack_variable(sp_8, 8, ailment.Const(None, None, 2, 64))
+    src.add_replacement(loc0, rax, rdi)
+
+    cp = src.copy()
+    cp.store_variable(rax, ailment.Const(None, None, 3, 64), loc1)
+    cp.store_stack_variable(sp_8, 8, ailment.Const(None, None, 4, 64))
+    cp.flush_pending_stores()
+    # rdi is propagated twice in the copy, which removes the replacement at loc0 from the copy
+    cp.add_replacement(loc1, rbx, rdi)
+    cp.filter_replacements()
+    nose.tools.assert_not_in(rax, cp._replacements[loc0])
+
+    nose.tools.assert_equal(src.get_variable(rax).value, 1)
+    nose.tools.assert_equal(src.get_stack_variable(sp_8, 8).value, 2)
+    nose.tools.assert_equal(dict(src._replacements), {loc0: {rax: rdi}})
+    nose.tools.assert_equal(src._prop_count[rdi], 1)
+    nose.tools.assert_equal(src._replacement_locs[rax], {loc0})
+    nose.tools.assert_equal(src._replacement_olds[rdi], {rax})
+
+
+def test_state_merge_copy_on_write():
+    arch = angr.load_shellcode(b"\xc3", "AMD64").arch
+    rax = ailment.Register(None, None, arch.registers['rax'][0], 64)
+    rbx = ailment.Register(None, None, arch.registers['rbx'][0], 64)
+    rcx = ailment.Register(None, None, arch.registers['rcx'][0], 64)
+    rsi = ailment.Register(None, None, arch.registers['rsi'][0], 64)
+    rdi = ailment.Register(None, None, arch.registers['rdi'][0], 64)
+    sp_8 = ailment.Expr.StackBaseOffset(None, 64, -8)
+    loc0 = CodeLocation(0x1337, 0)
+    loc1 = CodeLocation(0x1338, 0)
+
+    state0 = PropagatorAILState(arch)
+    state0.store_variable(rax, ailment.Const(None, None, 1, 64), loc0)
+    state0.store_stack_variable(sp_8, 8, ailment.Const(None, None, 2, 64))
+    state0.add_replacement(loc0, rax, rdi)
+    state1 = PropagatorAILState(arch)
+    state1.store_variable(rbx, ailment.Const(None, None, 3, 64), loc1)
+    state1.add_replacement(loc1, rbx, rsi)
+
+    merged = state0.merge(state1)
+    merged.store_variable(rax, ailment.Const(None, None, 4, 64), loc1)
+    merged.store_variable(rbx, ailment.Const(None, None, 5, 64), loc1)
+    merged.store_stack_variable(sp_8, 8, ailment.Const(None, None, 6, 64))
+    merged.flush_pending_stores()
+    merged.add_replacement(loc1, rax, rsi)
+    # rdi is propagated twice in the merged state, which removes the replacement at loc0 from the merged state
+    merged.add_replacement(loc1, rcx, rdi)
+    merged.filter_replacements()
+    nose.tools.assert_not_in(rax, merged._replacements[loc0])
+
+    nose.tools.assert_equal(state0.get_variable(rax).value, 1)
+    nose.tools.assert_equal(state0.get_stack_variable(sp_8, 8).value, 2)
+    nose.tools.assert_equal(dict(state0._replacements), {loc0: {rax: rdi}})
+    nose.tools.assert_equal(state0._prop_count[rdi], 1)
+    nose.tools.assert_equal(state0._replacement_locs[rax], {loc0})
+    nose.tools.assert_equal(state0._replacement_olds[rdi], {rax})
+    nose.tools.assert_equal(state1.get_variable(rbx).value, 3)
+    nose.tools.assert_equal(dict(state1._replacements), {loc1: {rbx: rsi}})
+    nose.tools.assert_equal(state1._replacement_locs[rbx], {loc1})
+
+
+if __name__ == "__main__":
+    test_constant_folding_bitwise()
+    test_constant_folding_shift_negative_operands()
+    test_filter_expressions_propagated_more_than_once()
+    test_stack_store_same_slot_twice()
+    test_stack_store_narrower_inside_wider()
+    test_stack_load_inside_pending_store()
+    test_state_copy_on_write()
+    test_state_merge_copy_on_write()